@@ -1,8 +1,9 @@
+import codecs
 import json
 import re
 from json.decoder import scanstring, WHITESPACE
 from json import detect_encoding, JSONDecodeError
-from time import time
+from time import time, sleep
 # Regex để nhận diện số (Number) theo chuẩn JSON
 NUMBER_RE = re.compile(
     r'(-?(?:0|[1-9]\d*))(\.\d+)?([eE][-+]?\d+)?',
@@ -153,10 +154,22 @@ class IterativeJSONParser:
                     raise JSONDecodeError(f"Unexpected character '{char}'", s, idx)
 
 class IterativeBufferedJSONParser:
-    def __init__(self, chunk_size=64*1024, encoding='utf-8'):
+    """
+    Parse file JSON theo từng chunk, yield các sự kiện như IterativeJSONParser.
+    Hỗ trợ checkpoint/resume: gọi checkpoint() sau khi nhận một sự kiện để lấy
+    trạng thái (serialize được bằng json), rồi resume(file, checkpoint) để parse tiếp
+    từ đúng vị trí đó. Offset là byte offset nên encoding phải không có BOM (vd: utf-8).
+    File được đọc ở chế độ binary và decode bằng incremental decoder, nên ký tự nhiều byte
+    bị cắt giữa hai lần đọc (hoặc giữa hai lần ghi khi follow) vẫn được ghép đúng.
+    follow=True: khi hết file thì chờ dữ liệu mới được ghi thêm (giống tail -f)
+    thay vì báo lỗi EOF.
+    """
+    def __init__(self, chunk_size=64*1024, encoding='utf-8', follow=False, poll_interval=1.0):
         self.chunk_size = chunk_size # 64KB mặc định
         self.encoding = encoding
-        
+        self.follow = follow
+        self.poll_interval = poll_interval
+
         # Buffer quản lý
         self.buf = ""
         self.idx = 0
@@ -164,6 +177,56 @@ class IterativeBufferedJSONParser:
         self.eof = False
         self._ws_match = WHITESPACE.match
 
+        # Trạng thái cho checkpoint
+        # Số byte đã đọc từ file (tính cả offset bắt đầu khi resume)
+        self.bytes_read = 0
+        self._decoder = None
+        self.stack = []
+        self.path = []
+        # True nếu đã yield map_key nhưng chưa đọc dấu ':'
+        self.after_key = False
+
+    def _tell(self):
+        """
+        Trả về byte offset trong file của self.idx.
+        Cuối buffer ứng với số byte đã đọc trừ đi các byte còn chờ trong decoder,
+        chỉ cần encode phần chưa xử lý của buffer (tối đa cỡ một chunk).
+        """
+        end = self.bytes_read - len(self._decoder.getstate()[0])
+        return end - len(self.buf[self.idx:].encode(self.encoding))
+
+    def checkpoint(self):
+        """
+        Trạng thái hiện tại để resume, chỉ hợp lệ khi gọi giữa hai sự kiện:
+        - offset: byte offset ngay sau sự kiện cuối cùng
+        - stack: các phần tử [TYPE, first_element_flag]
+        - path: đường dẫn key hiện tại (giống parse_base, 'item' cho phần tử của mảng)
+        - after_key: đã đọc key nhưng chưa đọc value
+        """
+        return {
+            'offset': self._tell(),
+            'stack': [list(context) for context in self.stack],
+            'path': list(self.path),
+            'after_key': self.after_key,
+        }
+
+    def _read_chunk(self):
+        """Đọc và decode chunk kế tiếp, trả về "" khi hết file."""
+        while True:
+            data = self.file_handle.read(self.chunk_size)
+            if data:
+                self.bytes_read += len(data)
+                text = self._decoder.decode(data)
+                # Chunk có thể chỉ chứa một phần của ký tự nhiều byte -> đọc tiếp
+                if text:
+                    return text
+            elif self.follow:
+                # Chế độ follow: chờ file được ghi thêm, byte lẻ vẫn nằm trong decoder
+                sleep(self.poll_interval)
+            else:
+                # EOF thật: final=True để báo lỗi nếu file bị cắt giữa ký tự
+                return self._decoder.decode(b'', True)
+
     def _ensure_buffer(self, min_needed=1):
         """
         Đảm bảo buffer còn đủ dữ liệu để đọc.
@@ -179,62 +242,104 @@ class IterativeBufferedJSONParser:
         buff_temp = []
         # Lấy phần dư chưa xử lý (Tail)
         buff_temp.append(self.buf[self.idx:])
-        
-        # Đọc thêm chunk mới
-        new_data = self.file_handle.read(self.chunk_size)
-        if not new_data:
-            self.eof = True
-            self.buf = "".join(buff_temp) # Giữ lại phần dư cuối cùng
-            self.idx = 0
-            return len(self.buf) > 0 # Trả về False nếu thực sự hết sạch
-        buff_temp.append(new_data)
-        # Nối chuỗi (Đây là đoạn tốn chi phí nhất của phương pháp này)
-        self.buf = "".join(buff_temp)
         self.idx = 0
-        match = self._ws_match(self.buf, self.idx)
-        if match:
-            self.buf = self.buf[match.end():]
-        return True
 
-    def parse(self, file):
+        # Đọc thêm chunk mới cho đến khi đủ min_needed ký tự
+        # (chunk nhỏ hoặc toàn khoảng trắng thì một lần đọc là không đủ)
+        while True:
+            new_data = self._read_chunk()
+            if not new_data:
+                self.eof = True
+                self.buf = "".join(buff_temp) # Giữ lại phần dư cuối cùng
+                return len(self.buf) > 0 # Trả về False nếu thực sự hết sạch
+            buff_temp.append(new_data)
+            # Nối chuỗi (Đây là đoạn tốn chi phí nhất của phương pháp này)
+            self.buf = "".join(buff_temp)
+            match = self._ws_match(self.buf, 0)
+            if match and match.end():
+                self.buf = self.buf[match.end():]
+            if len(self.buf) >= min_needed:
+                return True
+            buff_temp = [self.buf]
+
+    def _scanstring_retry(self):
+        """
+        scanstring khi chuỗi bị cắt ở cuối buffer: nạp thêm dữ liệu rồi thử lại
+        cho đến khi đọc hết chuỗi. Lỗi không nằm ở cuối buffer thì raise luôn.
+        """
+        while True:
+            try:
+                return scanstring(self.buf, self.idx + 1)
+            except JSONDecodeError as e:
+                truncated = e.msg.startswith('Unterminated string') or e.pos >= len(self.buf) - 6
+                if not truncated or not self._ensure_buffer(len(self.buf) - self.idx + 1):
+                    raise
+
+    def resume(self, file, checkpoint):
+        """Parse tiếp từ checkpoint đã lưu (xem checkpoint())."""
+        return self.parse(file, checkpoint)
+
+    def parse(self, file, checkpoint=None):
         # Cache local functions
         _ws_match = WHITESPACE.match
         _scanstring = scanstring
         _number_match = NUMBER_RE.match
 
-        with open(file, "r", encoding=self.encoding) as f:
+        # Đọc binary và tự decode để byte offset luôn chính xác
+        with open(file, "rb") as f:
             self.file_handle = f
-            self.buf = f.read(self.chunk_size)
-            self.idx = 0
             self.eof = False
-            
-            # Bỏ qua khoảng trắng đầu file
-            while True:
-                match = _ws_match(self.buf, self.idx)
-                if match:
-                    self.idx = match.end()
-                
-                # Nếu idx chạm đáy buffer, load thêm
-                if self.idx >= len(self.buf):
-                    if not self._ensure_buffer():
-                        return # EOF
-                else:
-                    break
-
-            # Khởi tạo Stack
-            stack = []
-            char = self.buf[self.idx]
-            
-            if char == '{':
-                yield ('start_map', None)
-                stack.append([TYPE_OBJ, True])
-                self.idx += 1
-            elif char == '[':
-                yield ('start_array', None)
-                stack.append([TYPE_ARR, True])
-                self.idx += 1
+            self._decoder = codecs.getincrementaldecoder(self.encoding)()
+            if checkpoint is None:
+                self.bytes_read = 0
+                self.stack = []
+                self.path = []
+                self.after_key = False
             else:
-                raise JSONDecodeError("Start with { or [", self.buf, self.idx)
+                self.bytes_read = checkpoint['offset']
+                self.stack = [list(context) for context in checkpoint['stack']]
+                self.path = list(checkpoint['path'])
+                self.after_key = checkpoint['after_key']
+                # Stack rỗng: root đã đóng ở lần parse trước
+                if not self.stack:
+                    return
+                f.seek(self.bytes_read)
+            # Buffer rỗng, chunk đầu tiên được nạp qua _ensure_buffer
+            self.buf = ""
+            self.idx = 0
+            stack = self.stack
+            path = self.path
+
+            if checkpoint is None:
+                # Bỏ qua khoảng trắng đầu file
+                while True:
+                    match = _ws_match(self.buf, self.idx)
+                    if match:
+                        self.idx = match.end()
+
+                    # Nếu idx chạm đáy buffer, load thêm
+                    if self.idx >= len(self.buf):
+                        if not self._ensure_buffer():
+                            return # EOF
+                    else:
+                        break
+
+                # Khởi tạo Stack
+                char = self.buf[self.idx]
+
+                # Cập nhật trạng thái trước khi yield để checkpoint() luôn đúng
+                if char == '{':
+                    stack.append([TYPE_OBJ, True])
+                    path.append(None)
+                    self.idx += 1
+                    yield ('start_map', None)
+                elif char == '[':
+                    stack.append([TYPE_ARR, True])
+                    path.append('item')
+                    self.idx += 1
+                    yield ('start_array', None)
+                else:
+                    raise JSONDecodeError("Start with { or [", self.buf, self.idx)
 
             # --- VÒNG LẶP CHÍNH ---
             while stack:
@@ -258,82 +363,90 @@ class IterativeBufferedJSONParser:
                 # print(self.buf, self.buf[self.idx])
                 char = self.buf[self.idx]
 
-                # --- XỬ LÝ DẤU ĐÓNG ---
-                if container_type == TYPE_OBJ and char == '}':
-                    stack.pop()
-                    yield ('end_map', None)
-                    self.idx += 1
-                    continue
-                elif container_type == TYPE_ARR and char == ']':
-                    stack.pop()
-                    yield ('end_array', None)
-                    self.idx += 1
-                    continue
-
-                # --- XỬ LÝ DẤU PHẨY ---
-                if not context[1]:
-                    if char == ',':
+                # after_key = True khi resume từ checkpoint ngay sau map_key
+                if not self.after_key:
+                    # --- XỬ LÝ DẤU ĐÓNG ---
+                    if container_type == TYPE_OBJ and char == '}':
+                        stack.pop()
+                        path.pop()
                         self.idx += 1
-                        # Skip whitespace sau dấu phẩy
-                        match = _ws_match(self.buf, self.idx)
-                        if match: 
-                            self.idx = match.end()
-                        
-                        # Reload buffer nếu cần để check ký tự kế tiếp (Trailing comma)
-                        if self.idx >= len(self.buf):
-                            if not self._ensure_buffer(): 
-                                raise JSONDecodeError("Unexpected EOF", "", 0)
+                        yield ('end_map', None)
+                        continue
+                    elif container_type == TYPE_ARR and char == ']':
+                        stack.pop()
+                        path.pop()
+                        self.idx += 1
+                        yield ('end_array', None)
+                        continue
 
-                        next_char = self.buf[self.idx]
-                        if (container_type == TYPE_OBJ and next_char == '}') or \
-                           (container_type == TYPE_ARR and next_char == ']'):
-                            continue
+                    # --- XỬ LÝ DẤU PHẨY ---
+                    if not context[1]:
+                        if char == ',':
+                            self.idx += 1
+                            # Skip whitespace sau dấu phẩy
+                            match = _ws_match(self.buf, self.idx)
+                            if match:
+                                self.idx = match.end()
+
+                            # Reload buffer nếu cần để check ký tự kế tiếp (Trailing comma)
+                            if self.idx >= len(self.buf):
+                                if not self._ensure_buffer():
+                                    raise JSONDecodeError("Unexpected EOF", "", 0)
+
+                            next_char = self.buf[self.idx]
+                            if (container_type == TYPE_OBJ and next_char == '}') or \
+                               (container_type == TYPE_ARR and next_char == ']'):
+                                continue
+                        else:
+                            # print(self.buf, self.buf[self.idx])
+                            # Logic lỏng lẻo: Nếu thiếu dấu phẩy nhưng gặp ký tự khác, có thể raise lỗi hoặc bỏ qua
+                            raise JSONDecodeError("Expecting ','", self.buf, self.idx)
                     else:
-                        # print(self.buf, self.buf[self.idx])
-                        # Logic lỏng lẻo: Nếu thiếu dấu phẩy nhưng gặp ký tự khác, có thể raise lỗi hoặc bỏ qua
-                        raise JSONDecodeError("Expecting ','", self.buf, self.idx)
-                else:
-                    context[1] = False
+                        context[1] = False
 
-                # --- XỬ LÝ KEY (OBJECT) ---
-                if container_type == TYPE_OBJ:
-                    if self.idx >= len(self.buf):
-                        if not self._ensure_buffer(): 
-                            raise JSONDecodeError("Unexpected EOF expecting Key", "", 0)
+                    # --- XỬ LÝ KEY (OBJECT) ---
+                    if container_type == TYPE_OBJ:
+                        if self.idx >= len(self.buf):
+                            if not self._ensure_buffer():
+                                raise JSONDecodeError("Unexpected EOF expecting Key", "", 0)
 
-                    if self.buf[self.idx] != '"':
-                        # print(self.buf)
-                        raise JSONDecodeError("Expecting property name", self.buf, self.idx)
-                    
-                    # SCANSTRING VỚI RETRY
-                    # scanstring có thể fail nếu chuỗi bị cắt giữa chừng (buffer hết)
-                    try:
-                        key, self.idx = _scanstring(self.buf, self.idx + 1)
-                    except JSONDecodeError:
-                        # Nếu lỗi, khả năng cao là hết buffer giữa chuỗi -> Load thêm và thử lại
-                        if self._ensure_buffer(64*1024): # Load thêm chunk
+                        if self.buf[self.idx] != '"':
+                            # print(self.buf)
+                            raise JSONDecodeError("Expecting property name", self.buf, self.idx)
+
+                        # SCANSTRING VỚI RETRY
+                        # scanstring có thể fail nếu chuỗi bị cắt giữa chừng (buffer hết)
+                        try:
                             key, self.idx = _scanstring(self.buf, self.idx + 1)
-                        else:
-                            raise
+                        except JSONDecodeError:
+                            # Nếu lỗi, khả năng cao là hết buffer giữa chuỗi -> Load thêm và thử lại
+                            key, self.idx = self._scanstring_retry()
 
-                    yield ('map_key', key)
+                        path[-1] = key
+                        self.after_key = True
+                        yield ('map_key', key)
 
-                    # Skip :
-                    match = _ws_match(self.buf, self.idx)
-                    if match: self.idx = match.end()
-                    
-                    if self.idx >= len(self.buf): 
-                        self._ensure_buffer()
-                    
+                        # Skip whitespace trước :
+                        match = _ws_match(self.buf, self.idx)
+                        if match: self.idx = match.end()
+
+                        if self.idx >= len(self.buf):
+                            if not self._ensure_buffer():
+                                raise JSONDecodeError("Unexpected EOF expecting :", self.buf, self.idx)
+
+                # --- XỬ LÝ DẤU : SAU KEY ---
+                if self.after_key:
                     if self.buf[self.idx] != ':':
                         raise JSONDecodeError("Expecting :", self.buf, self.idx)
                     self.idx += 1
-                    
+                    self.after_key = False
+
                     match = _ws_match(self.buf, self.idx)
-                    if match: 
+                    if match:
                         self.idx = match.end()
-                    if self.idx >= len(self.buf): 
-                        self._ensure_buffer()
+                    if self.idx >= len(self.buf):
+                        if not self._ensure_buffer():
+                            raise JSONDecodeError("Unexpected EOF expecting value", self.buf, self.idx)
 
                 # --- XỬ LÝ VALUE ---
                 char = self.buf[self.idx]
@@ -342,65 +455,69 @@ class IterativeBufferedJSONParser:
                     try:
                         val, self.idx = _scanstring(self.buf, self.idx + 1)
                     except JSONDecodeError:
-                        self._ensure_buffer(64*1024)
-                        val, self.idx = _scanstring(self.buf, self.idx + 1)
+                        val, self.idx = self._scanstring_retry()
                     yield ('value', val)
 
                 elif char == '{':
-                    yield ('start_map', None)
                     stack.append([TYPE_OBJ, True])
+                    path.append(None)
                     self.idx += 1
+                    yield ('start_map', None)
 
                 elif char == '[':
-                    yield ('start_array', None)
                     stack.append([TYPE_ARR, True])
+                    path.append('item')
                     self.idx += 1
+                    yield ('start_array', None)
 
                 elif char == 't':
                     # Cần đảm bảo đủ ký tự để check 'true'
-                    if self.idx + 4 > len(self.buf): 
+                    if self.idx + 4 > len(self.buf):
                         self._ensure_buffer(4)
                     if self.buf.startswith('true', self.idx):
-                        yield ('value', True)
                         self.idx += 4
+                        yield ('value', True)
 
                 elif char == 'f':
-                    if self.idx + 5 > len(self.buf): 
+                    if self.idx + 5 > len(self.buf):
                         self._ensure_buffer(5)
                     if self.buf.startswith('false', self.idx):
-                        yield ('value', False)
                         self.idx += 5
-                
+                        yield ('value', False)
+
                 elif char == 'n':
-                    if self.idx + 4 > len(self.buf): 
+                    if self.idx + 4 > len(self.buf):
                         self._ensure_buffer(4)
                     if self.buf.startswith('null', self.idx):
-                        yield ('value', None)
                         self.idx += 4
+                        yield ('value', None)
 
                 else:
                     # Xử lý số (Number)
                     # Số có thể bị cắt đôi (vd: 123|456). Regex sẽ không match hết.
                     # Chiến thuật: Thử match, nếu match chạm đáy buffer -> load thêm -> match lại
-                    
+
                     m = _number_match(self.buf, self.idx)
+                    # Nếu phần còn lại của buffer chỉ gồm ký tự của số (vd: "12", "1.", "1e+", "-")
+                    # thì có nguy cơ số chưa hết -> load thêm -> match lại
+                    end = m.end() if m else self.idx
+                    while len(self.buf) - end < 3 and not self.buf[end:].strip('.eE+-') and \
+                          self._ensure_buffer(len(self.buf) - self.idx + 1):
+                        m = _number_match(self.buf, self.idx) # Match lại trên buffer mới nối
+                        end = m.end() if m else self.idx
                     if m:
-                        # Nếu match kết thúc đúng tại cuối buffer, có nguy cơ số chưa hết
-                        if m.end() == len(self.buf) and not self.eof:
-                            self._ensure_buffer()
-                            m = _number_match(self.buf, self.idx) # Match lại trên buffer mới nối
-                        
                         num_str = m.group(0)
+                        self.idx = m.end()
                         if '.' in num_str or 'e' in num_str or 'E' in num_str:
                             yield ('value', float(num_str))
                         else:
                             yield ('value', int(num_str))
-                        self.idx = m.end()
                     else:
                         raise JSONDecodeError(f"Unexpected char '{char}'", self.buf, self.idx)
 
-def parse_base(parser_generator):
-    path = []
+def parse_base(parser_generator, path=None):
+    # path: đường dẫn ban đầu, vd: checkpoint['path'] khi dùng với resume()
+    path = [] if path is None else list(path)
     for event, value in parser_generator:
         if event == 'map_key':
             prefix = '.'.join(path[:-1])